@@ -86,6 +86,11 @@ class StatusBarApp(rumps.App):
         self.max_time = max_time
         self.timer = None
         self.elapsed_time = 0
+        self._last_title = None
+        # Started here, on the main thread, so ticks run on the main run loop even though
+        # start_app/stop_app are usually invoked from the key listener thread
+        self._title_timer = rumps.Timer(self._tick_title, 1)
+        self._title_timer.start()
 
     def change_language(self, sender):
         self.current_language = sender.title
@@ -107,7 +112,7 @@ class StatusBarApp(rumps.App):
             self.timer.start()
 
         self.start_time = time.time()
-        self.update_title()
+        self._tick_title(None)
 
     @rumps.clicked('Stop Recording')
     def stop_app(self, _):
@@ -121,18 +126,22 @@ class StatusBarApp(rumps.App):
             self.sound_player.play_stop()
         print('Transcribing...')
         self.title = "⏯"
+        self._last_title = None
         self.started = False
         self.menu['Stop Recording'].set_callback(None)
         self.menu['Start Recording'].set_callback(self.start_app)
         self.recorder.stop()
         print('Done.\n')
 
-    def update_title(self):
+    def _tick_title(self, _):
         if self.started:
             self.elapsed_time = int(time.time() - self.start_time)
             minutes, seconds = divmod(self.elapsed_time, 60)
-            self.title = f"({minutes:02d}:{seconds:02d}) 🔴"
-            threading.Timer(1, self.update_title).start()
+            title = f"({minutes:02d}:{seconds:02d}) 🔴"
+            # Skip the menu bar redraw when the displayed second has not changed
+            if title != self._last_title:
+                self.title = title
+                self._last_title = title
 
     def toggle(self):
         if self.started:
@@ -207,15 +216,15 @@ if __name__ == "__main__":
 
     # Type text into the active application when transcription finishes
     kb = keyboard.Controller()
-    def type_text(s: str):
-        is_first = True
-        for ch in s:
-            if is_first and ch == ' ':
-                is_first = False
-                continue
+    def type_text(s: str, _language=None):
+        # Called once per decoded segment; Recorder already drops the first segment's leading space.
+        # Type in 32-character chunks: some apps drop keystrokes from one long burst,
+        # but a pause per chunk is enough, not one per character
+        for i in range(0, len(s), 32):
+            if i:
+                time.sleep(0.002)
             try:
-                kb.type(ch)
-                time.sleep(0.0025)
+                kb.type(s[i:i + 32])
             except Exception:
                 pass
 
@@ -223,10 +232,14 @@ if __name__ == "__main__":
     recorder = Recorder(
         transcriber,
         on_done=(sound_player.play_transcribed if sound_player else None),
-        on_text=type_text,
+        on_partial=type_text,
+        max_seconds=args.max_time,
     )
 
     app = StatusBarApp(recorder, args.language, args.max_time, sound_player)
+    # Capture of the current take failed (Recorder already printed the traceback): take the menu bar
+    # out of the recording state. Transcription errors are only logged, since a later take may be recording.
+    recorder.on_error = lambda e: app.stop_app(None)
     if args.k_double_cmd:
         key_listener = DoubleCommandKeyListener(app)
     else:
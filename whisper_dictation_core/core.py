@@ -1,101 +1,369 @@
 import os
-import time
+import math
+import queue
+from concurrent.futures import Future
 import threading
+import traceback
 import numpy as np
 import pyaudio
-from faster_whisper import WhisperModel
+from faster_whisper import BatchedInferencePipeline, WhisperModel, download_model
+from faster_whisper.vad import VadOptions, get_speech_timestamps, merge_segments
 from AppKit import NSSound
 import subprocess
 
 
+MODEL_CACHE_DIR = os.path.expanduser("~/.cache/whisper-dictation")
+
+# Dictation clips are short: greedy decoding with no timestamp tokens or prompt carry-over.
+# Shared by SpeechTranscriber and the load-time warm-up so both run the same decode path.
+DECODE_OPTIONS = {
+    "beam_size": 1,
+    "best_of": 1,
+    "temperature": 0.0,
+    "condition_on_previous_text": False,
+    "without_timestamps": True,
+    "no_speech_threshold": 0.6,
+}
+
+
+def _resolve_model_path(model_name: str) -> str:
+    # Use the local copy when there is one so startup skips the Hugging Face Hub round trip
+    os.makedirs(MODEL_CACHE_DIR, exist_ok=True)
+    try:
+        return download_model(model_name, cache_dir=MODEL_CACHE_DIR, local_files_only=True)
+    except Exception:
+        return download_model(model_name, cache_dir=MODEL_CACHE_DIR)
+
+
+def _create_model(model_path: str, device: str, attempts, cpu_threads: int):
+    # Return the first (compute_type, extra options) combination the backend accepts
+    error = None
+    for compute_type, options in attempts:
+        try:
+            model = WhisperModel(
+                model_path, device=device, compute_type=compute_type, cpu_threads=cpu_threads, num_workers=1, **options
+            )
+            return model, compute_type
+        except Exception as e:
+            error = e
+    raise error
+
+
 def load_whisper_model(model_name: str):
+    model_path = _resolve_model_path(model_name)
+    # Leave one core free for audio capture and the UI instead of letting CTranslate2 take them all
+    cpu_threads = max((os.cpu_count() or 4) - 1, 1)
     try:
-        model = WhisperModel(model_name, device="auto", compute_type="float16")
-        print(f"{model_name} model loaded with faster-whisper (device=auto, compute_type=float16)")
-        return model
+        # Flash attention only exists on recent CUDA GPUs; retry without it before giving up on the accelerator
+        model, compute_type = _create_model(
+            model_path, "auto", [("float16", {"flash_attention": True}), ("float16", {})], cpu_threads
+        )
+        print(f"{model_name} model loaded with faster-whisper (device=auto, compute_type={compute_type})")
     except Exception as e:
         print("Hardware-accelerated backend initialization failed (" + str(e) + "). Falling back to CPU.")
-        model = WhisperModel(model_name, device="cpu", compute_type="int8")
-        print(f"{model_name} model loaded with faster-whisper (device=cpu, compute_type=int8)")
-        return model
+        # int8 weights with float32 activations where supported, plain int8 otherwise
+        model, compute_type = _create_model(model_path, "cpu", [("int8_float32", {}), ("int8", {})], cpu_threads)
+        print(f"{model_name} model loaded with faster-whisper (device=cpu, compute_type={compute_type})")
+    pipeline = BatchedInferencePipeline(model=model)
+    _warm_up(pipeline)
+    return pipeline
+
+
+def _warm_up(pipeline, batch_size=8, sample_rate=16000):
+    # Pay kernel setup and memory-pool allocation here rather than on the first dictation
+    try:
+        silence = np.zeros(batch_size * sample_rate, dtype=np.float32)
+        clips = [{"start": i * sample_rate, "end": (i + 1) * sample_rate} for i in range(batch_size)]
+        segments, _ = pipeline.transcribe(
+            silence,
+            language="en",
+            batch_size=batch_size,
+            vad_filter=False,
+            clip_timestamps=clips,
+            **DECODE_OPTIONS,
+        )
+        list(segments)
+    except Exception as e:
+        print("Model warm-up failed (" + str(e) + "). Continuing without it.")
 
 
 class SpeechTranscriber:
-    def __init__(self, model):
+    def __init__(self, model, batch_size=8):
         self.model = model
+        # Merged speech regions are padded to 30 s mel windows and encoded/decoded up to batch_size at a time
+        self.batch_size = batch_size
+        # Speech regions are capped at Whisper's 30 s window so each one fits a single batch entry
+        self.vad_options = VadOptions(min_silence_duration_ms=250, max_speech_duration_s=30)
 
-    def transcribe(self, audio_data, language=None) -> str:
+    def transcribe(self, audio_data, language=None, on_partial=None) -> str:
+        # Run VAD once here and hand only the speech regions to the model
+        speech = get_speech_timestamps(audio_data, self.vad_options)
+        if not speech:
+            return ""
         segments, info = self.model.transcribe(
             audio_data,
             language=language,
-            vad_filter=True,
+            batch_size=self.batch_size,
+            vad_filter=False,
+            clip_timestamps=merge_segments(speech, self.vad_options),
+            **DECODE_OPTIONS,
         )
-        text = "".join(segment.text for segment in segments)
-        return text
+        # segments is a lazy generator, but the batched pipeline yields a whole batch at once:
+        # on_partial only fires before the end when there are more than batch_size speech regions
+        out = []
+        for segment in segments:
+            out.append(segment.text)
+            if callable(on_partial):
+                on_partial(segment.text)
+        return "".join(out)
+
+
+# Tells the Recorder's long-lived threads to exit (None is a valid language)
+_CLOSE = object()
 
 
 class Recorder:
-    def __init__(self, transcriber, on_done=None, on_text=None):
+    def __init__(
+        self,
+        transcriber,
+        on_done=None,
+        on_text=None,
+        on_partial=None,
+        on_error=None,
+        on_transcribe_error=None,
+        max_seconds=30,
+        sample_rate=16000,
+    ):
         self.recording = False
         self.transcriber = transcriber
         self.on_done = on_done
+        # on_partial(text, language) gets each segment as decoded; on_text(text, language) the full take
         self.on_text = on_text
+        self.on_partial = on_partial
+        # on_error(e) reports a failed capture of the current take; on_transcribe_error(e, language)
+        # a failed transcription, which may finish while a later take is already recording
+        self.on_error = on_error
+        self.on_transcribe_error = on_transcribe_error
+        self.sample_rate = sample_rate
+        # Preallocated float32 PCM buffer; grown only if a recording outlasts max_seconds
+        self._pcm = np.empty(int(max_seconds * sample_rate), dtype=np.float32)
+        self._idx = 0
+        self._energy = 0.0
+        # Each start() gets a generation number; a capture ends once stop() has covered its generation,
+        # so a stop() quickly followed by start() cannot be missed by the capture thread
+        self._recording_cond = threading.Condition()
+        self._generation = 0
+        self._stopped_generation = 0
+        self.frames_per_buffer = 2048
+        # Open the input stream once; each recording only starts/stops it
+        self._pa = pyaudio.PyAudio()
+        self._stream = self._open_stream()
+        # Audio and result of the most recent recording, kept so it can be re-transcribed.
+        # Only touched on the transcription thread.
+        self.last_audio = None
+        self.last_result = None
+        # One capture thread and one transcription thread live as long as the Recorder,
+        # so CTranslate2 always runs on the same thread and sets up its thread pools once.
+        # _jobs holds (method, *args) tuples run on that thread; the last arg is the language.
+        self._starts = queue.Queue()
+        self._jobs = queue.Queue(maxsize=4)
+        threading.Thread(target=self._capture_worker, daemon=True).start()
+        threading.Thread(target=self._transcribe_worker, daemon=True).start()
 
     def start(self, language=None):
-        thread = threading.Thread(target=self._record_impl, args=(language,))
-        thread.start()
+        with self._recording_cond:
+            self._generation += 1
+            self.recording = True
+            generation = self._generation
+        self._starts.put((generation, language))
 
     def stop(self):
-        self.recording = False
+        with self._recording_cond:
+            self.recording = False
+            self._stopped_generation = self._generation
+            self._recording_cond.notify_all()
 
-    def _record_impl(self, language):
-        self.recording = True
-        frames_per_buffer = 2048
-        sample_rate = 16000
-        p = pyaudio.PyAudio()
-        stream = p.open(
-            format=pyaudio.paInt16,
+    def close(self):
+        self.stop()
+        self._starts.put(_CLOSE)
+        # _jobs is bounded: never block shutdown behind a transcription backlog. If it is full the
+        # worker misses the sentinel, but it is a daemon thread and exits with the process.
+        try:
+            self._jobs.put_nowait(_CLOSE)
+        except queue.Full:
+            pass
+        try:
+            self._stream.close()
+        except Exception:
+            pass
+        try:
+            self._pa.terminate()
+        except Exception:
+            pass
+
+    def _open_stream(self):
+        # Capture float32 directly: CoreAudio delivers float samples, so this skips
+        # the float->int16->float round trip and the /32768 normalization.
+        # Callback mode: PortAudio's thread fills the buffer, no Python thread blocks in read().
+        return self._pa.open(
+            format=pyaudio.paFloat32,
             channels=1,
-            rate=sample_rate,
-            frames_per_buffer=frames_per_buffer,
+            rate=self.sample_rate,
+            frames_per_buffer=self.frames_per_buffer,
             input=True,
+            start=False,
+            stream_callback=self._on_audio,
         )
-        frames = []
-
-        while self.recording:
-            try:
-                data = stream.read(frames_per_buffer, exception_on_overflow=False)
-            except OSError:
-                time.sleep(0.01)
-                continue
-            frames.append(data)
 
+    def _start_stream(self):
         try:
-            stream.stop_stream()
+            self._stream.start_stream()
+            return
         except Exception:
             pass
+        # The input device changed or went away since the stream was opened; reopen it
+        # on the current default device and try once more
         try:
-            stream.close()
+            self._stream.close()
         except Exception:
             pass
+        self._stream = self._open_stream()
+        self._stream.start_stream()
+
+    def transcribe_last(self, language=None) -> str:
+        # Waits for any take still being captured (blocks while recording), then queues behind
+        # its transcription so a re-transcription also runs on the transcription thread
+        self._starts.join()
+        result = Future()
+        self._jobs.put((self._transcribe_last_impl, result, language))
+        return result.result()
+
+    def _make_on_partial(self, language):
+        # Segments arrive with a leading space; drop it only before the first emitted text
+        first = [True]
+
+        def on_partial(text):
+            if first[0]:
+                text = text.lstrip()
+            if not text or not callable(self.on_partial):
+                return
+            first[0] = False
+            try:
+                self.on_partial(text, language)
+            except Exception:
+                pass
+
+        return on_partial
+
+    def _report_error(self, callback, *args):
+        traceback.print_exc()
+        if callable(callback):
+            try:
+                callback(*args)
+            except Exception:
+                pass
+
+    def _capture_worker(self):
+        while True:
+            item = self._starts.get()
+            try:
+                if item is _CLOSE:
+                    return
+                generation, language = item
+                try:
+                    audio = self._record_impl(generation)
+                except Exception as e:
+                    with self._recording_cond:
+                        current = self._generation == generation
+                        if current:
+                            self.recording = False
+                    # Only a failure of the take still in progress is reported as a capture error;
+                    # called outside the condition so the callback can take its own locks
+                    self._report_error(self.on_error if current else None, e)
+                    continue
+                # Silent takes are queued too (audio=None) so the cached result is cleared in order
+                self._jobs.put((self._transcribe_impl, audio, language))
+            finally:
+                # Only now is the take visible in _jobs; transcribe_last joins _starts first
+                self._starts.task_done()
+
+    def _transcribe_worker(self):
+        while True:
+            job = self._jobs.get()
+            try:
+                if job is _CLOSE:
+                    return
+                job[0](*job[1:])
+            except Exception as e:
+                self._report_error(self.on_transcribe_error, e, job[-1])
+            finally:
+                self._jobs.task_done()
+
+    def _on_audio(self, in_data, frame_count, time_info, status):
+        # Runs on PortAudio's thread; the only producer for _pcm while the stream is active
+        chunk = np.frombuffer(in_data, dtype=np.float32)
+        idx = self._idx
+        if idx + chunk.size > self._pcm.size:
+            grown = np.empty(max(2 * self._pcm.size, idx + chunk.size), dtype=np.float32)
+            grown[:idx] = self._pcm[:idx]
+            self._pcm = grown
+        self._pcm[idx:idx + chunk.size] = chunk
+        self._idx = idx + chunk.size
+        self._energy += float(np.dot(chunk, chunk))
+        return (None, pyaudio.paContinue)
+
+    def _record_impl(self, generation):
+        self._idx = 0
+        self._energy = 0.0
+        self._start_stream()
+
+        with self._recording_cond:
+            self._recording_cond.wait_for(lambda: self._stopped_generation >= generation)
+
+        # stop_stream returns only after the last callback has finished
         try:
-            p.terminate()
+            self._stream.stop_stream()
         except Exception:
             pass
 
-        audio_data = np.frombuffer(b"".join(frames), dtype=np.int16)
-        if audio_data.size == 0:
-            return
-        audio_data_fp32 = audio_data.astype(np.float32) / 32768.0
-        rms = float(np.sqrt(np.mean(np.square(audio_data_fp32)))) if audio_data_fp32.size else 0.0
+        idx = self._idx
+        energy = self._energy
+        if idx == 0:
+            return None
+        rms = math.sqrt(energy / idx)
         if rms < 0.002:
+            return None
+        # Hand the filled buffer off without copying; the next recording gets a fresh one
+        audio_data_fp32 = self._pcm[:idx]
+        self._pcm = np.empty(self._pcm.size, dtype=np.float32)
+        return audio_data_fp32
+
+    def _transcribe_last_impl(self, result, language):
+        # Reuses the last result if the language matches; failures go to the waiting caller
+        try:
+            if self.last_audio is None:
+                text = ""
+            elif self.last_result is not None and self.last_result[0] == language:
+                text = self.last_result[1]
+            else:
+                text = self.transcriber.transcribe(self.last_audio, language).lstrip()
+                self.last_result = (language, text)
+        except Exception as e:
+            result.set_exception(e)
             return
+        result.set_result(text)
 
-        emitted = self.transcriber.transcribe(audio_data_fp32, language)
+    def _transcribe_impl(self, audio_data_fp32, language):
+        self.last_audio = audio_data_fp32
+        self.last_result = None
+        if audio_data_fp32 is None:
+            return
+        emitted = self.transcriber.transcribe(audio_data_fp32, language, on_partial=self._make_on_partial(language))
+        self.last_result = (language, emitted.lstrip())
         if emitted and emitted.strip():
             if callable(self.on_text):
                 try:
-                    self.on_text(emitted)
+                    self.on_text(emitted.lstrip(), language)
                 except Exception:
                     pass
             if callable(self.on_done):
@@ -123,6 +391,14 @@ class SoundPlayer:
         self.stop_file = os.path.expanduser(stop_file) if stop_file else None
         self.transcribed_file = os.path.expanduser(transcribed_file) if transcribed_file else None
         self.sounds_dir = os.path.expanduser(sounds_dir) if sounds_dir else None
+        # Resolve and decode each cue once up front: playback then does no filesystem
+        # probing and plays a cached NSSound instead of spawning afplay
+        self._start_path = self._file_or_user_or_system(self.start_file, self.start_name)
+        self._stop_path = self._file_or_user_or_system(self.stop_file, self.stop_name)
+        self._transcribed_path = self._file_or_user_or_system(self.transcribed_file, self.transcribed_name)
+        self._start_snd = self._load_sound(self._start_path, self.start_name)
+        self._stop_snd = self._load_sound(self._stop_path, self.stop_name)
+        self._transcribed_snd = self._load_sound(self._transcribed_path, self.transcribed_name)
 
     def _system_sound_path(self, name: str) -> str | None:
         if not name:
@@ -146,24 +422,40 @@ class SoundPlayer:
                 return p
         return None
 
-    def _play_named_or_file(self, name: str | None, file_path: str | None):
+    def _file_or_user_or_system(self, file_path: str | None, name: str | None) -> str | None:
         if file_path and os.path.exists(file_path):
+            return file_path
+        if not name:
+            return None
+        return self._user_sound_path(name) or self._system_sound_path(name)
+
+    def _load_sound(self, path: str | None, name: str | None):
+        try:
+            if path:
+                snd = NSSound.alloc().initWithContentsOfFile_byReference_(path, True)
+                if snd:
+                    return snd
+            if name:
+                return NSSound.soundNamed_(name)
+        except Exception:
+            pass
+        return None
+
+    def _play(self, snd, path: str | None, name: str | None):
+        if snd:
             try:
-                subprocess.Popen(["afplay", file_path], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-                return
-            except Exception:
-                pass
-        upath = self._user_sound_path(name) if name else None
-        if upath:
-            try:
-                subprocess.Popen(["afplay", upath], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+                snd.stop()
+                snd.play()
                 return
             except Exception:
                 pass
-        spath = self._system_sound_path(name) if name else None
-        if spath:
+        self._play_named_or_file(path, name)
+
+    def _play_named_or_file(self, path: str | None, name: str | None):
+        # path is resolved once in __init__, so playback does no filesystem probing
+        if path:
             try:
-                subprocess.Popen(["afplay", spath], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+                subprocess.Popen(["afplay", path], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
                 return
             except Exception:
                 pass
@@ -177,11 +469,10 @@ class SoundPlayer:
                 pass
 
     def play_start(self):
-        self._play_named_or_file(self.start_name, self.start_file)
+        self._play(self._start_snd, self._start_path, self.start_name)
 
     def play_stop(self):
-        self._play_named_or_file(self.stop_name, self.stop_file)
+        self._play(self._stop_snd, self._stop_path, self.stop_name)
 
     def play_transcribed(self):
-        self._play_named_or_file(self.transcribed_name, self.transcribed_file)
-
+        self._play(self._transcribed_snd, self._transcribed_path, self.transcribed_name)
@@ -26,9 +26,31 @@ class ServerState:
 
 state = ServerState()
 
+_send_lock = threading.Lock()
+
+
 def send(obj):
-    sys.stdout.write(json.dumps(obj) + "\n")
-    sys.stdout.flush()
+    # Called from the stdin loop, the recorder threads and flush threads; keep lines whole
+    line = json.dumps(obj) + "\n"
+    with _send_lock:
+        sys.stdout.write(line)
+        sys.stdout.flush()
+
+
+def _ensure_recorder():
+    # Caller holds state._lock. Created once so the audio input stream is opened only once;
+    # a reload just swaps in the new transcriber.
+    if state.recorder:
+        state.recorder.transcriber = state.transcriber
+        return
+    state.recorder = Recorder(
+        state.transcriber,
+        on_done=_on_done_event,
+        on_text=_on_text_event,
+        on_partial=_on_partial_event,
+        on_error=_on_error_event,
+        on_transcribe_error=_on_transcribe_error_event,
+    )
 
 
 def handle_load(args):
@@ -38,13 +60,20 @@ def handle_load(args):
         with state._lock:
             state.model = load_whisper_model(model_name)
             state.transcriber = SpeechTranscriber(state.model)
-        send({"event": "loaded", "model_name": model_name})
     except Exception as e:
         # Ensure failure is visible to the client
         with state._lock:
             state.model = None
             state.transcriber = None
         send({"event": "error", "error": f"load_failed: {str(e)}"})
+        return
+    send({"event": "loaded", "model_name": model_name})
+    # A missing or busy microphone is not a model problem: keep the model and retry on "start"
+    try:
+        with state._lock:
+            _ensure_recorder()
+    except Exception as e:
+        send({"event": "error", "error": f"audio_open_failed: {str(e)}"})
 
 
 def _on_done_event():
@@ -52,6 +81,26 @@ def _on_done_event():
     send({"event": "transcribed"})
 
 
+def _on_text_event(text: str, language: Optional[str]):
+    # One "transcript" per recording; language is the one the recording was started with
+    send({"event": "transcript", "text": text, "language": language})
+
+
+def _on_partial_event(text: str, language: Optional[str]):
+    send({"event": "partial", "text": text, "language": language})
+
+
+def _on_error_event(e: Exception):
+    # Capture of the current take failed: the recorder is no longer recording, so let "start" through again
+    with state._lock:
+        state.running = False
+    send({"event": "error", "error": f"recorder_failed: {str(e)}"})
+
+
+def _on_transcribe_error_event(e: Exception, language: Optional[str]):
+    send({"event": "error", "error": f"transcribe_failed: {str(e)}", "language": language})
+
+
 def handle_start(args):
     language = args.get("language")
     with state._lock:
@@ -59,11 +108,7 @@ def handle_start(args):
             raise RuntimeError("Model not loaded")
         if state.running:
             return
-        def on_done_wrapper():
-            _on_done_event()
-        def on_text_wrapper(text: str):
-            send({"event": "transcript", "text": text, "language": language})
-        state.recorder = Recorder(state.transcriber, on_done=on_done_wrapper, on_text=on_text_wrapper)
+        _ensure_recorder()
         state.language = language
         state.running = True
         state.recorder.start(language)
@@ -79,19 +124,29 @@ def handle_stop(_args):
         # Stopping here triggers transcription in the recorder thread
         rec.stop()
 
-    # Busy-wait a short time until the recorder thread has transcribed.
-    # In a more advanced design, we'd pipe partials; for now, we just wait
-    # briefly and ask the client to listen for a follow-up "transcript" event.
-    # We can't get the text out of Recorder directly, so we instead have the
-    # client call "flush" which re-runs VAD+transcribe on the buffered audio.
+    # "partial" events and then one "transcript" event follow from the recorder threads.
+    # A client can also call "flush" to get the full text of the last recording again.
     send({"event": "stopped"})
 
 
 def handle_flush(args):
-    # Optional: accept raw PCM base64 to transcribe, but for simplicity here
-    # we do nothing. A future iteration can store frames inside Recorder and
-    # expose them. For now, this is a no-op placeholder.
-    send({"event": "noop"})
+    # Re-transcribe the last recording's buffered audio, optionally in another
+    # language. Waits for the recorder's own pass and reuses it when it matches.
+    # Runs on its own thread so stop/start commands are not stuck behind it.
+    with state._lock:
+        rec = state.recorder
+        language = args.get("language", state.language)
+    if not rec:
+        raise RuntimeError("Model not loaded")
+
+    def run():
+        try:
+            text = rec.transcribe_last(language)
+            send({"event": "flushed", "text": text, "language": language})
+        except Exception as e:
+            send({"event": "error", "error": f"flush_failed: {str(e)}"})
+
+    threading.Thread(target=run, daemon=True).start()
 
 
 def handle_status(_args):
@@ -119,6 +174,8 @@ def main():
             elif cmd == "status":
                 handle_status(args)
             elif cmd == "quit":
+                if state.recorder:
+                    state.recorder.close()
                 send({"event": "bye"})
                 break
             else: